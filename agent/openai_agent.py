@@ -1,30 +1,66 @@
 import base64
-import copy
 import io
 import json
 import logging
+import threading
+from collections import deque
 
 import pyttsx3
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 from openai import OpenAI
+from PIL import Image
 
 from agent.emulator import Emulator
-from config import MAX_TOKENS, OPENAI_MODEL, TEMPERATURE, USE_NAVIGATOR
+from config import MAX_TOKENS, OPENAI_MODEL, PNG_COMPRESS_LEVEL, TEMPERATURE, USE_NAVIGATOR
 
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
-def get_screenshot_base64(screenshot, upscale=1):
-    """Convert PIL image to base64 string."""
+_thread_local = threading.local()
+
+
+def _png_buffer():
+    """Return this thread's reusable PNG encode buffer."""
+    buffered = getattr(_thread_local, "png_buffer", None)
+    if buffered is None:
+        buffered = _thread_local.png_buffer = io.BytesIO()
+    return buffered
+
+
+_PNG_DATA_PREFIX = b"data:image/png;base64,"
+
+
+def get_screenshot_data_url(screenshot, upscale=1):
+    """Convert PIL image to a PNG data URL string."""
     if upscale > 1:
         new_size = (screenshot.width * upscale, screenshot.height * upscale)
-        screenshot = screenshot.resize(new_size)
+        screenshot = screenshot.resize(new_size, Image.Resampling.NEAREST)
+
+    buffered = _png_buffer()
+    # Overwrite from the start and trim afterwards: truncating an empty buffer
+    # first would free its capacity and defeat the reuse
+    buffered.seek(0)
+    screenshot.save(buffered, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    buffered.truncate()
+    # Release the view before returning so the buffer can be written next call
+    with buffered.getbuffer() as view:
+        # Join as bytes so the only str conversion is a single ASCII decode
+        return (_PNG_DATA_PREFIX + base64.standard_b64encode(view)).decode("ascii")
+
+
+_OMITTED_SCREENSHOT = {"type": "text", "text": "[previous screenshot omitted]"}
 
-    buffered = io.BytesIO()
-    screenshot.save(buffered, format="PNG")
-    return base64.standard_b64encode(buffered.getvalue()).decode()
+
+def _without_images(content):
+    """Return message content with image parts replaced by a text placeholder."""
+    return [_OMITTED_SCREENSHOT if part["type"] == "image_url" else part for part in content]
 
 
 SYSTEM_PROMPT = """You are playing Pokemon Red. You can see the game screen and control the game by executing emulator commands.
@@ -59,6 +95,16 @@ Please create a natural-sounding summary that includes:
 
 Write it in a conversational, first-person style as if you're explaining your Pokemon adventure to a friend. Keep it under 3-4 sentences and make it easy to understand when spoken aloud."""
 
+# Fixed messages and text shared by every request
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+_SUMMARY_MSG = {"role": "user", "content": SUMMARY_PROMPT}
+_TTS_SUMMARY_MSG = {"role": "user", "content": TTS_SUMMARY_PROMPT}
+_USER_PREAMBLE = (
+    "Here is the current game state from memory and a screenshot of the game screen. "
+    "Use the tools to decide what to do next.\n\n"
+    "GAME STATE:\n"
+)
+
 
 AVAILABLE_TOOLS = [
     {
@@ -107,6 +153,19 @@ if USE_NAVIGATOR:
         }
     )
 
+# AVAILABLE_TOOLS is fixed after import, so convert it to the OpenAI schema once.
+_OPENAI_TOOLS_CACHED = [
+    {
+        "type": "function",
+        "function": {
+            "name": tool["name"],
+            "description": tool["description"],
+            "parameters": tool["input_schema"],
+        },
+    }
+    for tool in AVAILABLE_TOOLS
+]
+
 
 class OpenAIAgent:
     def __init__(self, rom_path, headless=True, sound=False, max_history=60, load_state=None):
@@ -115,152 +174,164 @@ class OpenAIAgent:
         self.emulator.initialize()
         self.client = OpenAI()
         self.running = True
-        self.message_history = [
-            {"role": "user", "content": "You may now begin playing."}
-        ]
         self.max_history = max_history
+        # Unbounded on purpose: summarize_history() keeps it in check, and a maxlen
+        # would silently evict the summary message at index 0
+        self.message_history = deque(
+            [{"role": "user", "content": "You may now begin playing."}]
+        )
+        # Last encoded screenshot, reused while the emulator frame is unchanged
+        self._last_frame = None
+        self._last_data_url = None
+        # Memory state read by the last tool call, reused for the next user turn
+        self._last_state = None
+        # Only tools exposed to the model are dispatchable
+        self._tool_dispatch = {"press_buttons": self._handle_press_buttons}
+        if USE_NAVIGATOR:
+            self._tool_dispatch["navigate_to"] = self._handle_navigate_to
         if load_state:
             logger.info(f"Loading saved state from {load_state}")
             self.emulator.load_state(load_state)
 
-    def _openai_tools(self):
-        """Convert AVAILABLE_TOOLS into OpenAI tools schema."""
-        tools = []
-        for tool in AVAILABLE_TOOLS:
-            tools.append(
-                {
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": tool["description"],
-                        "parameters": tool["input_schema"],
-                    },
-                }
-            )
-        return tools
+    def _screenshot_data_url(self, screenshot):
+        """Return the upscaled PNG data URL for a screenshot, reusing the last encode if the frame is unchanged."""
+        # Compare raw frame bytes directly: a memcmp is cheaper than hashing and cannot collide
+        frame = screenshot.tobytes()
+        if frame != self._last_frame or self._last_data_url is None:
+            self._last_data_url = get_screenshot_data_url(screenshot, upscale=2)
+            self._last_frame = frame
+        return self._last_data_url
+
+    def _snapshot_and_encode(self):
+        """Capture the screenshot, its PNG data URL and the memory state for a user turn."""
+        screenshot = self.emulator.get_screenshot()
+        screenshot_url = self._screenshot_data_url(screenshot)
+        memory_info, self._last_state = self._last_state, None
+        if memory_info is None:
+            memory_info = self.emulator.get_state_from_memory()
+        return screenshot, screenshot_url, memory_info
 
     def _process_tool_call(self, tool_call):
         """Process a single OpenAI tool_call and return a text summary for a tool message."""
         name = tool_call.function.name
         try:
-            arguments = json.loads(tool_call.function.arguments or "{}")
-        except json.JSONDecodeError:
+            arguments = _json_loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError:  # orjson.JSONDecodeError is a subclass
             logger.error(f"Failed to decode tool arguments for {name}: {tool_call.function.arguments}")
             arguments = {}
 
         logger.info(f"Processing tool call: {name}")
 
-        if name == "press_buttons":
-            buttons = arguments.get("buttons", [])
-            wait = arguments.get("wait", True)  # Default to True for better game state updates
-            logger.info(f"[Buttons] Pressing: {buttons} (wait={wait})")
+        handler = self._tool_dispatch.get(name)
+        if handler is None:
+            logger.error(f"Unknown tool called: {name}")
+            return f"Error: Unknown tool '{name}'"
+        return handler(arguments)
 
-            try:
-                # Process the button presses
-                result = self.emulator.press_buttons(buttons, wait)
-                
-                # Get the current game state after the button press
-                memory_info = self.emulator.get_state_from_memory()
-                location = self.emulator.get_location() or "Unknown location"
-                dialog = self.emulator.get_active_dialog() or ""
-                
-                # Log the state for debugging
-                logger.info("[Memory State after action]")
-                logger.info(memory_info)
-                
-                collision_map = self.emulator.get_collision_map()
-                if collision_map:
-                    logger.info(f"[Collision Map after action]\n{collision_map}")
-                
-                # Build a detailed response
-                response_parts = [
-                    f"Action: Pressed buttons: {', '.join(buttons)}",
-                    f"Location: {location}",
-                ]
-                
-                if dialog:
-                    response_parts.append(f"Dialog: {dialog}")
-                
-                response_parts.append(f"Game State:\n{memory_info}")
-                
-                return "\n".join(response_parts)
-                
-            except Exception as e:
-                logger.error(f"Error processing button press: {e}")
-                return f"Error processing button press: {str(e)}"
-
-        if name == "navigate_to":
-            row = arguments.get("row")
-            col = arguments.get("col")
-            logger.info(f"[Navigation] Navigating to: ({row}, {col})")
-
-            status, path = self.emulator.find_path(row, col)
-            if path:
-                for direction in path:
-                    self.emulator.press_buttons([direction], True)
-                result = f"Navigation successful: followed path with {len(path)} steps. Status: {status}"
-            else:
-                result = f"Navigation failed: {status}"
-
-            screenshot = self.emulator.get_screenshot()
-            _ = get_screenshot_base64(screenshot, upscale=2)
-            memory_info = self.emulator.get_state_from_memory()
+    def _handle_press_buttons(self, arguments):
+        """Press the requested buttons and describe the resulting game state."""
+        buttons = arguments.get("buttons", [])
+        wait = arguments.get("wait", True)  # Default to True for better game state updates
+        logger.info(f"[Buttons] Pressing: {buttons} (wait={wait})")
 
-            logger.info("[Memory State after navigation]")
+        try:
+            # Process the button presses
+            self.emulator.press_buttons(buttons, wait)
+            
+            # Get the current game state after the button press
+            memory_info = self.emulator.get_state_from_memory()
+            self._last_state = memory_info
+            location = self.emulator.get_location() or "Unknown location"
+            dialog = self.emulator.get_active_dialog() or ""
+            
+            # Log the state for debugging
+            logger.info("[Memory State after action]")
             logger.info(memory_info)
-
+            
             collision_map = self.emulator.get_collision_map()
             if collision_map:
-                logger.info(f"[Collision Map after navigation]\n{collision_map}")
-
-            return (
-                f"Navigation result: {result}\n\n"
-                f"Game state after navigation:\n{memory_info}"
-            )
-
-        logger.error(f"Unknown tool called: {name}")
-        return f"Error: Unknown tool '{name}'"
+                logger.info(f"[Collision Map after action]\n{collision_map}")
+            
+            # Build a detailed response
+            response_parts = [
+                f"Action: Pressed buttons: {', '.join(buttons)}",
+                f"Location: {location}",
+            ]
+            
+            if dialog:
+                response_parts.append(f"Dialog: {dialog}")
+            
+            response_parts.append(f"Game State:\n{memory_info}")
+            
+            return "\n".join(response_parts)
+            
+        except Exception as e:
+            logger.error(f"Error processing button press: {e}")
+            return f"Error processing button press: {str(e)}"
+
+    def _handle_navigate_to(self, arguments):
+        """Follow a path to the requested grid cell and describe the resulting game state."""
+        row = arguments.get("row")
+        col = arguments.get("col")
+        logger.info(f"[Navigation] Navigating to: ({row}, {col})")
+
+        status, path = self.emulator.find_path(row, col)
+        if path:
+            self.emulator.press_buttons(path, True)
+            result = f"Navigation successful: followed path with {len(path)} steps. Status: {status}"
+        else:
+            result = f"Navigation failed: {status}"
+
+        memory_info = self.emulator.get_state_from_memory()
+        self._last_state = memory_info
+
+        logger.info("[Memory State after navigation]")
+        logger.info(memory_info)
+
+        collision_map = self.emulator.get_collision_map()
+        if collision_map:
+            logger.info(f"[Collision Map after navigation]\n{collision_map}")
+
+        return (
+            f"Navigation result: {result}\n\n"
+            f"Game state after navigation:\n{memory_info}"
+        )
 
     def run(self, num_steps=1):
         """Main agent loop using OpenAI's chat.completions and tools."""
         logger.info(f"Starting OpenAI agent loop for {num_steps} steps")
 
+        # The emulator kept ticking since the last call, so state left by its final tool call is stale
+        self._last_state = None
+
         steps_completed = 0
         while self.running and steps_completed < num_steps:
             try:
-                messages = copy.deepcopy(self.message_history)
-
                 # Get current screenshot and game state from memory for the user turn
-                screenshot = self.emulator.get_screenshot()
-                screenshot_b64 = get_screenshot_base64(screenshot, upscale=2)
-                memory_info = self.emulator.get_state_from_memory()
+                screenshot, screenshot_url, memory_info = self._snapshot_and_encode()
 
                 user_content = [
                     {
                         "type": "text",
-                        "text": (
-                            "Here is the current game state from memory and a screenshot of the game screen. "
-                            "Use the tools to decide what to do next.\n\n"
-                            f"GAME STATE:\n{memory_info}"
-                        ),
+                        "text": _USER_PREAMBLE + memory_info,
                     },
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{screenshot_b64}",
+                            "url": screenshot_url,
                         },
                     },
                 ]
 
-                messages.insert(0, {"role": "system", "content": SYSTEM_PROMPT})
-                messages.append({"role": "user", "content": user_content})
+                user_msg = {"role": "user", "content": user_content}
+                messages = [_SYSTEM_MSG, *self.message_history, user_msg]
 
                 response = self.client.chat.completions.create(
                     model=OPENAI_MODEL,
                     temperature=TEMPERATURE,
                     max_tokens=MAX_TOKENS,
                     messages=messages,
-                    tools=self._openai_tools(),
+                    tools=_OPENAI_TOOLS_CACHED,
                     tool_choice="auto",
                 )
 
@@ -283,8 +354,10 @@ class OpenAIAgent:
                 for tc in tool_calls:
                     logger.info(f"[Tool] Using tool: {tc.function.name}")
 
-                # Update history with this turn (keep structures close to SimpleAgent)
-                self.message_history.append({"role": "user", "content": user_content})
+                # Update history with this turn (keep structures close to SimpleAgent).
+                # Only the latest turn needs its screenshot; resending every past image
+                # would make each request grow with the history.
+                self.message_history.append({"role": "user", "content": _without_images(user_content)})
                 self.message_history.append({"role": "assistant", "content": message.content or ""})
 
                 # Execute tools, but do not persist tool messages in history.
@@ -316,13 +389,17 @@ class OpenAIAgent:
         """Generate a summary of the conversation history and replace it with the summary."""
         logger.info("[OpenAI Agent] Generating conversation summary...")
 
+        # The summary requests take seconds while the emulator keeps playing out queued
+        # buttons, so the next turn must read fresh state rather than the last tool call's
+        self._last_state = None
+
         screenshot = self.emulator.get_screenshot()
-        screenshot_b64 = get_screenshot_base64(screenshot, upscale=2)
+        screenshot_url = self._screenshot_data_url(screenshot)
 
         messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            *copy.deepcopy(self.message_history),
-            {"role": "user", "content": SUMMARY_PROMPT},
+            _SYSTEM_MSG,
+            *self.message_history,
+            _SUMMARY_MSG,
         ]
 
         response = self.client.chat.completions.create(
@@ -339,9 +416,9 @@ class OpenAIAgent:
 
         # Generate TTS-friendly summary
         tts_messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            *copy.deepcopy(self.message_history),
-            {"role": "user", "content": TTS_SUMMARY_PROMPT},
+            _SYSTEM_MSG,
+            *self.message_history,
+            _TTS_SUMMARY_MSG,
         ]
         
         tts_response = self.client.chat.completions.create(
@@ -362,7 +439,8 @@ class OpenAIAgent:
             logger.warning(f"Text-to-speech failed: {e}")
 
         # Replace history with a single user message composed of text + image, similar to SimpleAgent
-        self.message_history = [
+        self.message_history.clear()
+        self.message_history.append(
             {
                 "role": "user",
                 "content": [
@@ -375,7 +453,7 @@ class OpenAIAgent:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{screenshot_b64}",
+                            "url": screenshot_url,
                         },
                     },
                     {
@@ -387,7 +465,7 @@ class OpenAIAgent:
                     },
                 ],
             }
-        ]
+        )
 
         logger.info("[OpenAI Agent] Message history condensed into summary.")
 
@@ -5,4 +5,7 @@ MAX_TOKENS = 4000
 
 USE_NAVIGATOR = False
 
-OPENAI_MODEL = "gpt-4.1-mini"
\ No newline at end of file
+OPENAI_MODEL = "gpt-4.1-mini"
+
+# zlib level for screenshot PNGs sent to the model (1 = fastest, 9 = smallest)
+PNG_COMPRESS_LEVEL = 1
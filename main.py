@@ -2,6 +2,7 @@ import argparse
 import logging
 import os
 import msvcrt
+import queue
 import threading
 import time
 
@@ -17,6 +18,44 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Number of frame steps to run per pass of the tick loops before polling the keyboard
+TICKS_PER_POLL = 10
+
+# Console keys read by the key reader thread, consumed by the tick loops
+_key_queue = queue.Queue()
+
+
+def _key_reader():
+    """Block on console key presses and hand them to the tick loops."""
+    while True:
+        _key_queue.put(msvcrt.getch())
+
+
+def _poll_key():
+    """Return the next queued console key, or None if no key is waiting.
+
+    getch() reads Ctrl+C as a plain b"\x03" key instead of raising, so it is
+    turned back into a KeyboardInterrupt here for the tick loops to handle.
+    """
+    try:
+        key = _key_queue.get_nowait()
+    except queue.Empty:
+        return None
+    if key == b"\x03":
+        raise KeyboardInterrupt
+    return key
+
+
+def _sleep_until(deadline):
+    """Sleep until the monotonic deadline and return it, or return now if already late."""
+    now = time.monotonic()
+    if deadline > now:
+        time.sleep(deadline - now)
+        return deadline
+    # Running behind: resync instead of bursting to catch up
+    return now
+
+
 def main():
     parser = argparse.ArgumentParser(description="AI Plays Pokemon - Starter Version")
     parser.add_argument(
@@ -101,26 +140,29 @@ def main():
     frames_per_step = 1   # 1 frame per ~1/60s -> ~60fps
     sleep_seconds = 1 / 60
 
+    key_thread = threading.Thread(target=_key_reader, daemon=True)
+    key_thread.start()
+
     try:
+        deadline = time.monotonic()
         while True:
-            # Advance some frames so the game keeps running
-            agent.emulator.tick(frames_per_step)
+            # Advance a batch of frames so the game keeps running
+            agent.emulator.tick(frames_per_step * TICKS_PER_POLL)
 
             # Non-blocking check for NumPad 8 or speed controls in the console
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-                if key in (b"8",):
-                    break
-                elif key in (b"-",):
-                    print("\n[Speed] Setting emulator to ~60fps")
-                    frames_per_step = 1
-                    sleep_seconds = 1 / 60
-                elif key in (b"=", b"+",):
-                    print("\n[Speed] Setting emulator to ~300fps")
-                    frames_per_step = 5      # 5 * 60 ~= 300fps
-                    sleep_seconds = 1 / 60   # keep same wall-clock rate, more frames per tick
-
-            time.sleep(sleep_seconds)
+            key = _poll_key()
+            if key in (b"8",):
+                break
+            elif key in (b"-",):
+                print("\n[Speed] Setting emulator to ~60fps")
+                frames_per_step = 1
+                sleep_seconds = 1 / 60
+            elif key in (b"=", b"+",):
+                print("\n[Speed] Setting emulator to ~300fps")
+                frames_per_step = 5      # 5 * 60 ~= 300fps
+                sleep_seconds = 1 / 60   # keep same wall-clock rate, more frames per tick
+
+            deadline = _sleep_until(deadline + sleep_seconds * TICKS_PER_POLL)
 
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt during manual phase, exiting.")
@@ -145,25 +187,25 @@ def main():
     # Main loop to keep the emulator running and handle user input
     try:
         print("\nAI is now playing. Press 'q' to quit or use speed controls (-/=)")
+        deadline = time.monotonic()
         while True:
-            agent.emulator.tick(frames_per_step)
+            agent.emulator.tick(frames_per_step * TICKS_PER_POLL)
             
             # Handle user input for controls
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-                if key in (b"q", b"Q"):
-                    print("\nQuitting...")
-                    break
-                elif key in (b"-",):
-                    print("\n[Speed] Setting emulator to ~60fps")
-                    frames_per_step = 1
-                    sleep_seconds = 1 / 60
-                elif key in (b"=", b"+"):
-                    print("\n[Speed] Setting emulator to ~300fps")
-                    frames_per_step = 5
-                    sleep_seconds = 1 / 60
+            key = _poll_key()
+            if key in (b"q", b"Q"):
+                print("\nQuitting...")
+                break
+            elif key in (b"-",):
+                print("\n[Speed] Setting emulator to ~60fps")
+                frames_per_step = 1
+                sleep_seconds = 1 / 60
+            elif key in (b"=", b"+"):
+                print("\n[Speed] Setting emulator to ~300fps")
+                frames_per_step = 5
+                sleep_seconds = 1 / 60
             
-            time.sleep(sleep_seconds)
+            deadline = _sleep_until(deadline + sleep_seconds * TICKS_PER_POLL)
 
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, stopping.")